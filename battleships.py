@@ -1,72 +1,115 @@
 from enum import Enum
 from os import system
-from random import randint, choice, shuffle
+from random import Random
 from sys import platform
 from time import sleep
-from types import UnionType
 from typing import Optional, Type, Iterator, Self
 from colorama import Fore, Style, init
 
-from vec2 import Vec2, vec_scalar_multiply, vec_add, vec_invert
+from vec2 import Vec2, Coord
 
 
 class User:
     def __init__(self) -> None:
-        self.board: MainBoard = new_board(SquareState.EMPTY, BOARD_HEIGHT, BOARD_WIDTH)
+        self.board: MainBoard = new_board(EMPTY, BOARD_HEIGHT, BOARD_WIDTH)
         self.ships: list[Ship] = []
-        self.knowledge: KnowledgeBoard = new_board(
-            KnowledgeSquareState.UNKNOWN, BOARD_HEIGHT, BOARD_WIDTH
-        )
+        self.alive_ships: int = 0
+        self.square_to_ship: dict[Coord, Ship] = {}
+        # Bit y * BOARD_WIDTH + x is set for each square covered by a ship
+        self.occupied_mask: int = 0
+        self.knowledge: KnowledgeBoard = new_board(UNKNOWN, BOARD_HEIGHT, BOARD_WIDTH)
+        # Squares still UNKNOWN in knowledge
+        self.unknown_squares: SquarePool = SquarePool(BOARD_HEIGHT * BOARD_WIDTH)
 
 
 class Ship:
-    def __init__(self, squares: list[Vec2]) -> None:
+    def __init__(self, squares: list[Coord], mask: int) -> None:
         self.hits: int = 0
         self.sunk: bool = False
-        self.squares: list[Vec2] = squares
+        self.squares: list[Coord] = squares
+        self.length: int = len(squares)
+        self.mask: int = mask
 
     def hit(self) -> bool:
         # Returns True if ship is sunk
         self.hits += 1
-        if self.hits == len(self.squares):
+        if self.hits == self.length:
             self.sunk = True
             return True
         return False
 
 
-class Orientation(Enum):
-    N = Vec2(0, -1)
-    E = Vec2(1, 0)
-    S = Vec2(0, 1)
-    W = Vec2(-1, 0)
+class SquarePool:
+    # Set of flat board indices with O(1) removal and random choice
+    def __init__(self, size: int) -> None:
+        self.indices: list[int] = list(range(size))
+        self.positions: dict[int, int] = {index: index for index in range(size)}
+
+    def __len__(self) -> int:
+        return len(self.indices)
 
+    def __contains__(self, index: int) -> bool:
+        return index in self.positions
 
-class SquareState(Enum):
-    EMPTY = " "
-    SHIP = "#"
-    MISS = "·"
-    HIT = "X"
+    def random(self) -> int:
+        return self.indices[RNG.randrange(len(self.indices))]
+
+    def discard(self, index: int) -> None:
+        position = self.positions.pop(index, None)
+        if position is None:
+            return
+        # Fill the gap with the last index so the list stays dense
+        last = self.indices.pop()
+        if last != index:
+            self.indices[position] = last
+            self.positions[last] = position
 
 
-class KnowledgeSquareState(Enum):
-    UNKNOWN = " "
-    MISS = "·"
-    HIT = "X"
+class Orientation(Enum):
+    N = (0, -1)
+    E = (1, 0)
+    S = (0, 1)
+    W = (-1, 0)
 
 
 # Constants
-LOOP_MAX = 100000
 BOARD_WIDTH = 10
 BOARD_HEIGHT = 10
 SHIP_LENGTHS = [5, 4, 3, 3, 2]
+# Game's own random source, created and seeded once at import
+RNG = Random()
+# Square states, shared by main and knowledge boards
+EMPTY = 0
+SHIP = 1
+MISS = 2
+HIT = 3
+UNKNOWN = EMPTY
+ORIENTATIONS = tuple(Orientation)
+# Unit step, e.g. (1, 0), to the orientation that moves that way
+ORIENTATION_BY_STEP = {orientation.value: orientation for orientation in ORIENTATIONS}
+# Indexed by square state value
+GLYPHS = (" ", "#", "·", "X")
+HEADER = "│   " + " ".join(str(x) for x in range(BOARD_WIDTH)) + "   │"
+LINE_WIDTH = BOARD_WIDTH * 2 + 5
+BORDER_TOP = "┌" + "─" * LINE_WIDTH + "┐"
+BORDER_MIDDLE = "├" + "─" * LINE_WIDTH + "┤"
+BORDER_BOTTOM = "└" + "─" * LINE_WIDTH + "┘"
+ROW_LABELS = [chr(y + 65) for y in range(BOARD_HEIGHT)]
+# Every valid square in notation, e.g. "c4" -> Vec2(4, 2)
+NOTATION = {
+    f"{ROW_LABELS[y].lower()}{x}": Vec2(x, y)
+    for y in range(BOARD_HEIGHT)
+    for x in range(BOARD_WIDTH)
+}
 # Types
-MainBoard: Type = list[list[SquareState]]
-KnowledgeBoard: Type = list[list[KnowledgeSquareState]]
-Board: UnionType = MainBoard | KnowledgeBoard
+# Boards are flat, row-major: square (x, y) is at index y * BOARD_WIDTH + x
+Board: Type = bytearray
+MainBoard: Type = Board
+KnowledgeBoard: Type = Board
 
 
 def shuffled(a: list) -> list:
-    shuffle(a)
+    RNG.shuffle(a)
     return a
 
 
@@ -78,49 +121,101 @@ def clear() -> None:
 
 
 def new_board(default, height, width) -> Board:
-    return [[default for _ in range(width)] for _ in range(height)]
+    return bytearray([default]) * (height * width)
 
 
-def square_in_board(square: Vec2, board: Board) -> bool:
-    width = len(board[0])
-    height = len(board)
-    return 0 <= square.x < width and 0 <= square.y < height
+def square_in_board(
+    square: Coord, width: int = BOARD_WIDTH, height: int = BOARD_HEIGHT
+) -> bool:
+    x, y = square
+    return 0 <= x < width and 0 <= y < height
 
 
-def random_square(board: Board, matching: SquareState | KnowledgeSquareState) -> Vec2:
-    board_height = len(board)
-    board_width = len(board[0])
-    for _ in range(LOOP_MAX):
-        coord = Vec2(randint(0, board_height - 1), randint(0, board_width - 1))
-        if board[coord.y][coord.x] is matching:
-            return coord
-    exit(200)
+def random_square(pool: SquarePool) -> Coord:
+    if len(pool) == 0:
+        exit(200)
+    index = pool.random()
+    return index % BOARD_WIDTH, index // BOARD_WIDTH
 
 
-def extend(origin: Vec2, direction: Vec2, length: int) -> Vec2:
-    return vec_add(origin, vec_scalar_multiply(direction, length))
+def extend(origin: Coord, direction: Coord, length: int) -> Coord:
+    return origin[0] + direction[0] * length, origin[1] + direction[1] * length
 
 
 def new_valid_ship(
-    origin: Vec2, orientation: Orientation, length: int, owner: User
+    origin: Coord, orientation: Orientation, length: int, owner: User
 ) -> Optional[Ship]:
-    squares = [extend(origin, orientation.value, i) for i in range(length)]
-    # Confirm all squares are in the board
-    if not all(square_in_board(square, owner.board) for square in squares):
+    origin_x, origin_y = origin
+    dx, dy = orientation.value
+    end_x = origin_x + dx * (length - 1)
+    end_y = origin_y + dy * (length - 1)
+    # Ships are straight, so only the two ends can fall outside the board
+    if not (
+        0 <= origin_x < BOARD_WIDTH
+        and 0 <= origin_y < BOARD_HEIGHT
+        and 0 <= end_x < BOARD_WIDTH
+        and 0 <= end_y < BOARD_HEIGHT
+    ):
         return None
+    squares = [(origin_x + dx * i, origin_y + dy * i) for i in range(length)]
+    mask = 0
+    for x, y in squares:
+        mask |= 1 << (y * BOARD_WIDTH + x)
     # Check if any already placed ships' squares overlap with our squares
-    if any(
-        len([square for square in squares if square in existing_ship.squares]) > 0
-        for existing_ship in owner.ships
-    ):
+    if mask & owner.occupied_mask:
         return None
 
-    return Ship(squares)
+    return Ship(squares, mask)
 
 
-def place_ship(ship: Ship, board: Board) -> None:
+def place_ship(ship: Ship, owner: User) -> None:
+    owner.ships.append(ship)
+    owner.alive_ships += 1
+    owner.occupied_mask |= ship.mask
     for square in ship.squares:
-        board[square.y][square.x] = SquareState.SHIP
+        x, y = square
+        index = y * BOARD_WIDTH + x
+        owner.board[index] = SHIP
+        owner.square_to_ship[square] = ship
+
+
+def candidate_placements(length: int) -> list[tuple[int, Coord, Orientation]]:
+    # Every in-board (mask, origin, orientation) for a ship on an empty board.
+    # N and W reach the same footprints as S and E from the other end, so only
+    # E and S are listed. Each footprint appears once (twice for length 1), which
+    # keeps a uniform pick uniform over footprints
+    candidates = []
+    for orientation in (Orientation.E, Orientation.S):
+        dx, dy = orientation.value
+        for y in range(BOARD_HEIGHT - dy * (length - 1)):
+            for x in range(BOARD_WIDTH - dx * (length - 1)):
+                mask = 0
+                for i in range(length):
+                    mask |= 1 << ((y + dy * i) * BOARD_WIDTH + x + dx * i)
+                candidates.append((mask, (x, y), orientation))
+    return candidates
+
+
+# Ship length to its candidate placements, which don't depend on the owner
+PLACEMENTS = {
+    length: candidate_placements(length)
+    for length in range(1, max(BOARD_WIDTH, BOARD_HEIGHT) + 1)
+}
+
+
+def legal_placements(owner: User, length: int) -> list[tuple[int, Coord, Orientation]]:
+    return [
+        candidate
+        for candidate in PLACEMENTS.get(length, [])
+        if not candidate[0] & owner.occupied_mask
+    ]
+
+
+def place_random_ships(owner: User, lengths: list[int]) -> None:
+    # Pick uniformly from the placements that are still legal, so no retries
+    for length in lengths:
+        _, origin, orientation = RNG.choice(legal_placements(owner, length))
+        place_ship(new_valid_ship(origin, orientation, length, owner), owner)
 
 
 class FireResult(Enum):
@@ -130,62 +225,60 @@ class FireResult(Enum):
     SUNK = 4
 
 
-def fire_missile(coord: Vec2, source: User, target: User) -> FireResult:
+def fire_missile(coord: Coord, source: User, target: User) -> FireResult:
+    x, y = coord
+    index = y * BOARD_WIDTH + x
     # If already fired at this square
-    if source.knowledge[coord.y][coord.x] != KnowledgeSquareState.UNKNOWN:
+    if source.knowledge[index] != UNKNOWN:
         return FireResult.FAIL
+    source.unknown_squares.discard(index)
     # Check if shot is a hit or a miss
-    for ship in target.ships:
-        if coord in ship.squares:
-            sunk = ship.hit()
-            target.board[coord.y][coord.x] = SquareState.HIT
-            source.knowledge[coord.y][coord.x] = KnowledgeSquareState.HIT
-            return FireResult.SUNK if sunk else FireResult.HIT
-    else:
-        source.knowledge[coord.y][coord.x] = KnowledgeSquareState.MISS
-        target.board[coord.y][coord.x] = SquareState.MISS
+    ship = target.square_to_ship.get(coord)
+    if ship is None:
+        source.knowledge[index] = MISS
+        target.board[index] = MISS
         return FireResult.MISS
+    target.board[index] = HIT
+    source.knowledge[index] = HIT
+    if ship.hit():
+        target.alive_ships -= 1
+        return FireResult.SUNK
+    return FireResult.HIT
 
 
-def display_board(board: Board) -> None:
-    height = len(board)
-    width = len(board[0])
-    print("│   " + " ".join([str(x) for x in range(width)]) + "   │")
-    for y in range(height):
-        print(f"│ {chr(y + 65)} ", end="")
-        print(*[square.value for square in board[y]], sep=" ", end="   │\n")
+def render_board(board: Board) -> str:
+    lines = [HEADER]
+    for y in range(BOARD_HEIGHT):
+        row = board[y * BOARD_WIDTH : (y + 1) * BOARD_WIDTH]
+        glyphs = " ".join([GLYPHS[square] for square in row])
+        lines.append(f"│ {ROW_LABELS[y]} {glyphs}   │")
+    return "\n".join(lines)
 
 
 def display_boards(user: User) -> None:
     clear()
-    board_width = len(user.board[0])
-    line_width = board_width * 2 + 5
-    print("┌" + "─" * line_width + "┐")
-    display_board(user.knowledge)
-    print("├" + "─" * line_width + "┤")
-    display_board(user.board)
-    print("└" + "─" * line_width + "┘")
+    # Print the whole frame at once rather than line by line
+    print(
+        "\n".join(
+            [
+                BORDER_TOP,
+                render_board(user.knowledge),
+                BORDER_MIDDLE,
+                render_board(user.board),
+                BORDER_BOTTOM,
+            ]
+        )
+    )
 
 
 def message(text: str, user: User, colour: str = "") -> None:
     display_boards(user)
     print(colour + text + Style.RESET_ALL)
-    sleep(len(text.split(" ")) / 4 + 0.5)
-
+    sleep((text.count(" ") + 1) / 4 + 0.5)
 
-def decode_notation(text: str, board: Board) -> Optional[Vec2]:
-    if len(text) != 2:
-        return None
-    try:
-        # "a" = 0
-        row = ord(text.lower()[0]) - 97
-        column = int(text[1])
-        if not square_in_board(Vec2(column, row), board):
-            return None
-    except ValueError:
-        return None
 
-    return Vec2(column, row)
+def decode_notation(text: str) -> Optional[Vec2]:
+    return NOTATION.get(text.lower())
 
 
 class State:
@@ -195,19 +288,19 @@ class State:
 
 class RandomState(State):
     def update(self, user: User, player: User) -> Optional[State]:
-        target = random_square(user.knowledge, KnowledgeSquareState.UNKNOWN)
+        target = random_square(user.unknown_squares)
         result = fire_missile(target, user, player)
         if result == FireResult.HIT:
-            return LookAroundState(user, target)
+            return LookAroundState(target)
 
 
 class LookAroundState(State):
-    def __init__(self, user: User, centre: Vec2):
+    def __init__(self, centre: Coord):
         self.centre = centre
         self.to_check: Iterator[Orientation] = (
             orientation
-            for orientation in shuffled(list(Orientation))
-            if square_in_board(vec_add(centre, orientation.value), user.board)
+            for orientation in shuffled(list(ORIENTATIONS))
+            if square_in_board(extend(centre, orientation.value, 1))
         )
 
     def update(self, user: User, player: User) -> Optional[State]:
@@ -215,7 +308,7 @@ class LookAroundState(State):
             orientation = next(self.to_check)
         except StopIteration:
             return RandomState()
-        result = fire_missile(vec_add(self.centre, orientation.value), user, player)
+        result = fire_missile(extend(self.centre, orientation.value, 1), user, player)
         match result:
             case FireResult.HIT:
                 return ExploreState(self.centre, orientation)
@@ -227,7 +320,7 @@ class LookAroundState(State):
 
 
 class ExploreState(State):
-    def __init__(self, centre: Vec2, orientation: Orientation):
+    def __init__(self, centre: Coord, orientation: Orientation):
         self.centre = centre
         self.orientation: Orientation = orientation
         self.check_opposite: bool = False
@@ -237,11 +330,12 @@ class ExploreState(State):
         # Fully explore the orientation
         self.extent += 1
         if self.check_opposite:
-            result = fire_missile(
-                extend(self.centre, vec_invert(self.orientation.value), self.extent),
-                user,
-                player,
-            )
+            target = extend(self.centre, self.orientation.value, -self.extent)
+            if not square_in_board(target):
+                # Reached the edge, so fall back to a random shot this turn
+                state = RandomState()
+                return state.update(user, player) or state
+            result = fire_missile(target, user, player)
             match result:
                 case FireResult.MISS | FireResult.SUNK:
                     return RandomState()
@@ -250,11 +344,12 @@ class ExploreState(State):
                 case _:
                     return None
 
-        result = fire_missile(
-            extend(self.centre, self.orientation.value, self.extent),
-            user,
-            player,
-        )
+        target = extend(self.centre, self.orientation.value, self.extent)
+        if not square_in_board(target):
+            self.check_opposite = True
+            self.extent = 0
+            return self.update(user, player)
+        result = fire_missile(target, user, player)
         match result:
             case FireResult.MISS:
                 self.check_opposite = True
@@ -273,17 +368,7 @@ class ExploreState(State):
 def battleships() -> None:
     # AI ship placement
     ai = User()
-    for length in SHIP_LENGTHS:
-        new_ship = None
-        while new_ship is None:
-            new_ship = new_valid_ship(
-                random_square(ai.board, SquareState.EMPTY),
-                choice(list(Orientation)),
-                length,
-                ai,
-            )
-        ai.ships.append(new_ship)
-        place_ship(new_ship, ai.board)
+    place_random_ships(ai, SHIP_LENGTHS)
 
     # Player ship placement
     player = User()
@@ -298,39 +383,37 @@ def battleships() -> None:
     ]
     for ship in ships:
         new_ship = new_valid_ship(ship[0], ship[1], ship[2], player)
-        player.ships.append(new_ship)
-        place_ship(new_ship, player.board)
+        place_ship(new_ship, player)
     available_ship_lengths = []
     # ----------------- END TEST -------------
-    boards = [player.knowledge, player.board]
     while len(available_ship_lengths) > 0:
         display_boards(player)
 
         inp = input("Enter start/end points of a ship to place it (e.g. c0 c2): ")
         if inp == "exit":
             return
-        point_a, point_b = (decode_notation(w, player.board) for w in inp.split(" "))
+        point_a, point_b = (decode_notation(w) for w in inp.split(" "))
         if point_a is None or point_b is None:
             message("Error: One or more points invalid", player)
             continue
 
-        if point_a.y == point_b.y:
-            displacement = point_b.x - point_a.x
-            orientation = Orientation.E if displacement > 0 else Orientation.W
-        elif point_a.x == point_b.x:
-            displacement = point_b.y - point_a.y
-            orientation = Orientation.S if displacement > 0 else Orientation.N
-        else:
+        dx = point_b.x - point_a.x
+        dy = point_b.y - point_a.y
+        if dx == 0 and dy == 0:
+            message("Error: Ship length not available", player)
+            continue
+        step = ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+        orientation = ORIENTATION_BY_STEP.get(step)
+        if orientation is None:
             # Diagonal
             continue
 
-        length = abs(displacement) + 1
+        length = abs(dx) + abs(dy) + 1
         if length in available_ship_lengths:
             new_ship = new_valid_ship(point_a, orientation, length, player)
             if new_ship is not None:
                 available_ship_lengths.remove(length)
-                player.ships.append(new_ship)
-                place_ship(new_ship, player.board)
+                place_ship(new_ship, player)
         else:
             message("Error: Ship length not available", player)
 
@@ -342,7 +425,7 @@ def battleships() -> None:
         while result == FireResult.FAIL:
             display_boards(player)
             inp = input("Enter square to fire missile (e.g. c4): ")
-            square = decode_notation(inp, player.board)
+            square = decode_notation(inp)
             if square is None:
                 message("Error: invalid square", player, colour=Fore.RED)
                 continue
@@ -363,12 +446,12 @@ def battleships() -> None:
             ai_state = state
 
         # Win condition
-        if all(ship.sunk for ship in player.ships):
-            display_boards(*boards)
+        if player.alive_ships == 0:
+            display_boards(player)
             input("You LOST! Press enter...")
             break
-        if all(ship.sunk for ship in ai.ships):
-            display_boards(*boards)
+        if ai.alive_ships == 0:
+            display_boards(player)
             input("You WON! Press enter...")
             break
 
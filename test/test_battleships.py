@@ -2,32 +2,43 @@ from unittest import TestCase
 
 from battleships import (
     User,
-    SquareState,
+    EMPTY,
+    SHIP,
+    MISS,
+    HIT,
+    BOARD_WIDTH,
+    BOARD_HEIGHT,
     Orientation,
     new_board,
     extend,
     square_in_board,
     decode_notation,
     new_valid_ship,
+    place_ship,
+    fire_missile,
+    FireResult,
+    SquarePool,
+    random_square,
+    legal_placements,
+    place_random_ships,
+    render_board,
 )
 from vec2 import Vec2
 
 
 class Test(TestCase):
     def test_new_board(self):
-        assert new_board(SquareState.EMPTY, 3, 2) == [
-            [SquareState.EMPTY, SquareState.EMPTY],
-            [SquareState.EMPTY, SquareState.EMPTY],
-            [SquareState.EMPTY, SquareState.EMPTY],
-        ]
+        assert new_board(EMPTY, 3, 2) == bytearray([EMPTY] * 6)
+        assert new_board(SHIP, 2, 2) == bytearray([SHIP] * 4)
 
     def test_square_in_board(self):
-        board = new_board(SquareState.EMPTY, 5, 10)
-        assert square_in_board(Vec2(0, 0), board)
-        assert square_in_board(Vec2(9, 4), board)
-        assert not square_in_board(Vec2(5, 10), board)
-        assert not square_in_board(Vec2(10, 0), board)
-        assert not square_in_board(Vec2(0, 5), board)
+        assert square_in_board(Vec2(0, 0))
+        assert square_in_board(Vec2(9, 9))
+        assert not square_in_board(Vec2(5, 10))
+        assert not square_in_board(Vec2(10, 0))
+        assert not square_in_board(Vec2(-1, 5))
+        assert square_in_board(Vec2(9, 4), 10, 5)
+        assert not square_in_board(Vec2(0, 5), 10, 5)
 
     def test_extend(self):
         origin = Vec2(4, 6)
@@ -39,14 +50,86 @@ class Test(TestCase):
 
     def test_new_valid_ship(self):
         player = User()
+        ship = new_valid_ship(Vec2(1, 1), Orientation.E, 3, player)
+        assert ship.squares == [Vec2(1, 1), Vec2(2, 1), Vec2(3, 1)]
+        assert ship.mask == 0b1110 << BOARD_WIDTH
+        assert new_valid_ship(Vec2(8, 0), Orientation.E, 3, player) is None
+        assert new_valid_ship(Vec2(0, 1), Orientation.N, 3, player) is None
+        place_ship(ship, player)
+        assert new_valid_ship(Vec2(2, 0), Orientation.S, 3, player) is None
+        assert new_valid_ship(Vec2(4, 0), Orientation.S, 3, player) is not None
+
+    def test_legal_placements(self):
+        player = User()
+        # Horizontal and vertical each fit 9 positions along a row/column, 10 times
+        assert len(legal_placements(player, 2)) == 2 * 9 * 10
+        assert len(legal_placements(player, 1)) == 2 * 10 * 10
+        assert legal_placements(player, 11) == []
+        place_ship(new_valid_ship(Vec2(0, 0), Orientation.E, 10, player), player)
+        assert len(legal_placements(player, 10)) == 9
+        assert len(legal_placements(player, 2)) == 9 * 9 + 8 * 10
+        mask, origin, orientation = legal_placements(player, 2)[0]
+        assert mask == new_valid_ship(origin, orientation, 2, player).mask
+
+    def test_place_random_ships(self):
+        player = User()
+        place_random_ships(player, [5, 4, 3, 3, 2])
+        assert sorted(len(ship.squares) for ship in player.ships) == [2, 3, 3, 4, 5]
+        assert len(player.square_to_ship) == 17
+        assert player.occupied_mask.bit_count() == 17
+
+    def test_fire_missile(self):
+        player = User()
+        ai = User()
+        place_ship(new_valid_ship(Vec2(1, 1), Orientation.E, 2, ai), ai)
+        assert ai.alive_ships == 1
+        assert fire_missile(Vec2(0, 0), player, ai) == FireResult.MISS
+        assert fire_missile(Vec2(0, 0), player, ai) == FireResult.FAIL
+        assert fire_missile(Vec2(1, 1), player, ai) == FireResult.HIT
+        assert fire_missile(Vec2(2, 1), player, ai) == FireResult.SUNK
+        assert ai.alive_ships == 0
+        assert player.knowledge[0] == MISS
+        assert player.knowledge[BOARD_WIDTH + 1] == HIT
+        assert ai.board[BOARD_WIDTH + 2] == HIT
+
+    def test_render_board(self):
+        player = User()
+        place_ship(new_valid_ship(Vec2(1, 1), Orientation.E, 2, player), player)
+        lines = render_board(player.board).split("\n")
+        assert len(lines) == BOARD_HEIGHT + 1
+        assert lines[0] == "│   0 1 2 3 4 5 6 7 8 9   │"
+        assert lines[2] == "│ B   # #                 │"
+
+    def test_square_pool(self):
+        pool = SquarePool(4)
+        pool.discard(1)
+        pool.discard(1)
+        pool.discard(3)
+        assert len(pool) == 2
+        assert 1 not in pool and 3 not in pool
+        assert sorted(pool.indices) == [0, 2]
+        assert pool.random() in (0, 2)
+        pool.discard(0)
+        assert pool.random() == 2
+        assert random_square(pool) == Vec2(2, 0)
+
+    def test_pools_track_board(self):
+        player = User()
+        ai = User()
+        place_ship(new_valid_ship(Vec2(1, 1), Orientation.E, 2, ai), ai)
+        fire_missile(Vec2(0, 0), player, ai)
+        fire_missile(Vec2(1, 1), player, ai)
+        assert 0 not in player.unknown_squares
+        assert BOARD_WIDTH + 1 not in player.unknown_squares
+        assert len(player.unknown_squares) == BOARD_WIDTH * BOARD_HEIGHT - 2
 
     def test_decode_notation(self):
-        board = new_board(SquareState.EMPTY, 7, 7)
-        assert decode_notation("a0", board) == Vec2(0, 0)
-        assert decode_notation("c4", board) == Vec2(4, 2)
-        assert decode_notation("C4", board) == Vec2(4, 2)
-        assert decode_notation("z4", board) is None
-        assert decode_notation("c9", board) is None
-        assert decode_notation("", board) is None
-        assert decode_notation("*!@2_-42.", board) is None
-        assert decode_notation("4c", board) is None
+        assert decode_notation("a0") == Vec2(0, 0)
+        assert decode_notation("c4") == Vec2(4, 2)
+        assert decode_notation("C4") == Vec2(4, 2)
+        assert decode_notation("j9") == Vec2(9, 9)
+        assert decode_notation("z4") is None
+        assert decode_notation("k9") is None
+        assert decode_notation("") is None
+        assert decode_notation("*!@2_-42.") is None
+        assert decode_notation("4c") is None
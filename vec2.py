@@ -6,6 +6,10 @@ class Vec2(NamedTuple):
     y: int
 
 
+# Plain (x, y) pair, compares and hashes equal to the matching Vec2
+Coord = tuple[int, int]
+
+
 def vec_add(a: Vec2, b: Vec2) -> Vec2:
     return Vec2(a.x + b.x, a.y + b.y)
 